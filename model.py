@@ -14,10 +14,35 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
 
+import os
+import sys
+import json
+import time
 import logging
 
+import dbus
+from gi.repository import Gio
+from gi.repository import GLib
 from gi.repository import GObject
 from aptdaemon import client as apt
+from aptdaemon import enums
+
+from sugar3 import env
+
+from . import schedule
+
+_HISTORY_PATH = os.path.join(env.get_profile_path(), 'updater-history.json')
+
+_ORIGINS_HELPER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'origins.py')
+
+_UPDATE_SCHEMA = 'org.sugarlabs.update'
+_PRIORITY_ORIGINS_KEY = 'priority-origins'
+
+_UPOWER_SERVICE = 'org.freedesktop.UPower'
+_UPOWER_DEVICE_PATH = '/org/freedesktop/UPower/devices/DisplayDevice'
+_UPOWER_DEVICE_IFACE = 'org.freedesktop.UPower.Device'
+_UPOWER_STATE_DISCHARGING = 2
 
 
 class SystemUpdaterModel(GObject.GObject):
@@ -31,6 +56,13 @@ class SystemUpdaterModel(GObject.GObject):
     EXIT_FAILED = 1
     EXIT_CANCELLED = 2
 
+    PRIORITY_SECURITY = schedule.PRIORITY_SECURITY
+    PRIORITY_ORIGIN = schedule.PRIORITY_ORIGIN
+    PRIORITY_REGULAR = schedule.PRIORITY_REGULAR
+
+    # fraction of the remaining battery time usable for updates
+    BATTERY_BUDGET = 0.5
+
     progress_signal = GObject.Signal('progress',
                                      arg_types=([float]))
     progress_detail_signal = GObject.Signal('progress-detail',
@@ -47,6 +79,17 @@ class SystemUpdaterModel(GObject.GObject):
         self._client = apt.AptClient()
         self._state = None
         self._transaction = None
+        self._groups = []
+        self._installed = []
+        self._deferred = []
+        self._interrupted = []
+        self._cancelled = False
+        self._group_count = 0
+        self._install_started = None
+        self._download_started = None
+        self._download_finished = None
+        self._download_sizes = {}
+        self._history = schedule.load_history(_HISTORY_PATH)
 
     def get_state(self):
         return self._state
@@ -94,24 +137,128 @@ class SystemUpdaterModel(GObject.GObject):
                                    error_handler=self.__error_cb)
         logging.debug('check-size-out')
 
-    def update(self, packages):
+    def get_battery_budget(self):
+        """Return the seconds available for updates when running on
+        battery, or None when there is no such limit."""
+        try:
+            bus = dbus.SystemBus()
+            device = bus.get_object(_UPOWER_SERVICE, _UPOWER_DEVICE_PATH)
+            properties = dbus.Interface(device, dbus.PROPERTIES_IFACE)
+            state = properties.Get(_UPOWER_DEVICE_IFACE, 'State')
+            time_to_empty = properties.Get(_UPOWER_DEVICE_IFACE,
+                                           'TimeToEmpty')
+        except dbus.DBusException:
+            logging.exception('Could not read battery status')
+            return None
+
+        if state != _UPOWER_STATE_DISCHARGING or time_to_empty <= 0:
+            return None
+        return time_to_empty * self.BATTERY_BUDGET
+
+    def get_deferred(self):
+        """Packages left out of the last update to fit its budget."""
+        return self._deferred
+
+    def get_interrupted(self):
+        """Packages left out of the last update because one of its
+        groups failed or was cancelled."""
+        return self._interrupted
+
+    def update(self, packages, budget=None):
+        """Install packages one priority group at a time.
+
+        When budget (in seconds) is given, only the leading groups whose
+        estimated time fits in it are installed, the rest are deferred.
+        """
         logging.debug('update-in')
         self._state = self.STATE_UPDATING
+        self._groups = []
+        self._installed = []
+        self._deferred = []
+        self._interrupted = []
+        self._cancelled = False
+
+        # XXX the apt cache is too slow and big to open inside the shell
+        try:
+            process = Gio.Subprocess.new(
+                [sys.executable, _ORIGINS_HELPER] + list(packages),
+                Gio.SubprocessFlags.STDOUT_PIPE)
+        except GLib.Error:
+            logging.exception('Could not run the origins helper')
+            GLib.idle_add(self._start_update, packages, {}, budget)
+        else:
+            process.communicate_utf8_async(None, None, self.__origins_cb,
+                                           (packages, budget))
+        logging.debug('update-out')
+
+    def _start_update(self, packages, details, budget):
+        groups = schedule.get_groups(packages, details,
+                                     _get_priority_origins())
+        self._groups, self._deferred = schedule.plan(groups, self._history,
+                                                     budget)
+
+        self._group_count = len(self._groups)
+        if not self._groups:
+            self.finished_signal.emit(self.EXIT_SUCCESS, [])
+        else:
+            self._update_next_group()
+
+    def _update_next_group(self):
+        # the previous transaction can't be cancelled anymore, honor any
+        # cancel requested while waiting for this one
+        if self._cancelled:
+            self._finish_update(self.EXIT_CANCELLED)
+            return
+
+        packages = self._groups[0]
+        self._install_started = None
+        self._download_started = None
+        self._download_finished = None
+        self._download_sizes = {}
         self._transaction = self._client.upgrade_packages(packages)
         self._transaction.connect('progress-download-changed',
                                   self.__update_progress_cb)
+        self._transaction.connect('status-changed',
+                                  self.__update_status_cb)
         self._transaction.connect('finished',
                                   self.__update_finished_cb)
         self._transaction.connect('cancellable-changed',
                                   self.__cancellable_cb)
         self._transaction.run(reply_handler=self.__reply_cb,
                               error_handler=self.__error_cb)
-        logging.debug('update-out')
 
     def cancel(self):
+        if self._state == self.STATE_UPDATING:
+            self._cancelled = True
         if self._transaction and self._transaction.cancellable:
             self._transaction.cancel()
 
+    def _finish_update(self, status, packages=()):
+        if status != self.EXIT_SUCCESS:
+            self._interrupted = list(packages)
+            for group in self._groups:
+                self._interrupted.extend(group)
+            self._groups = []
+            # still report what the groups that did succeed installed
+            if self._installed:
+                status = self.EXIT_SUCCESS
+        self.finished_signal.emit(status, self._installed)
+
+    def _record_history(self, packages):
+        now = time.time()
+        size = sum(self._download_sizes.values())
+        if self._download_started is not None:
+            seconds = self._download_finished - self._download_started
+            if size > 0 and seconds > 0:
+                schedule.add_sample(self._history, 'download',
+                                    (size, seconds))
+        # without a committing status the install time can't be told
+        # apart from authorization and queue waiting
+        if self._install_started is not None:
+            schedule.add_sample(self._history, 'install',
+                                (len(packages), now - self._install_started))
+        schedule.save_history(_HISTORY_PATH, self._history)
+
     def _convert_status(self, status):
         if status == 'exit-success':
             status = self.EXIT_SUCCESS
@@ -147,10 +294,42 @@ class SystemUpdaterModel(GObject.GObject):
 
     def __update_finished_cb(self, transaction, status):
         logging.debug('__update_finished_cb %s', status)
-        packages = []
-        for package in transaction.packages[4]:
-            packages.append(str(package))
-        self.finished_signal.emit(self._convert_status(status), packages)
+        packages = self._groups.pop(0)
+
+        status = self._convert_status(status)
+        if status == self.EXIT_SUCCESS:
+            for package in transaction.packages[4]:
+                self._installed.append(str(package))
+            self._record_history(packages)
+            # aptdaemon fails a transaction asked to upgrade an up-to-date
+            # package, so skip those already pulled as dependencies
+            queued = len(self._groups)
+            self._groups, dropped = schedule.drop_upgraded(
+                self._groups, transaction.dependencies[4])
+            self._installed.extend(dropped)
+            self._group_count -= queued - len(self._groups)
+            if self._groups:
+                # XXX do not trigger a transaction creation from callback
+                GLib.idle_add(self._update_next_group)
+                return
+
+        self._finish_update(status, packages)
+
+    def __origins_cb(self, process, result, user_data):
+        packages, budget = user_data
+        details = {}
+        try:
+            success, stdout, stderr = process.communicate_utf8_finish(result)
+            if process.get_successful():
+                details = json.loads(stdout)
+            else:
+                logging.error('The origins helper failed')
+        except (GLib.Error, ValueError):
+            logging.exception('Could not read the origins helper output')
+        if not isinstance(details, dict):
+            details = {}
+        # without details everything goes in a single regular group
+        self._start_update(packages, details, budget)
 
     def __refresh_progress_cb(self, transaction, current_items, total_items,
                               current_bytes, total_bytes, current_cps, eta):
@@ -168,9 +347,23 @@ class SystemUpdaterModel(GObject.GObject):
                              total_bytes, current_bytes, extra):
         logging.debug('__update_progress_cb %s %s %s',
                       description, str(current_bytes), str(total_bytes))
-        self.progress_signal.emit(float(current_bytes) / float(total_bytes))
+        # only count what is actually fetched, cached files report nothing
+        now = time.time()
+        if self._download_started is None:
+            self._download_started = now
+        self._download_finished = now
+        self._download_sizes[uri] = total_bytes
+        done = self._group_count - len(self._groups)
+        progress = float(current_bytes) / float(total_bytes)
+        self.progress_signal.emit((done + progress) / self._group_count)
         self.progress_detail_signal.emit(description)
 
+    def __update_status_cb(self, transaction, status):
+        logging.debug('__update_status_cb %s', status)
+        if status == enums.STATUS_COMMITTING and \
+                self._install_started is None:
+            self._install_started = time.time()
+
     def __cancellable_cb(self, transaction, cancellable):
         logging.debug('__cancellable_cb %r', cancellable)
         self.cancellable_signal.emit(cancellable)
@@ -178,3 +371,16 @@ class SystemUpdaterModel(GObject.GObject):
     def __check_size_cb(self, transaction, download):
         logging.debug('__check_size_cb %d', download)
         self.size_signal.emit(download)
+
+
+def _get_priority_origins():
+    # the key is optional, deployments add it to the update schema
+    source = Gio.SettingsSchemaSource.get_default()
+    schema = None
+    if source is not None:
+        schema = source.lookup(_UPDATE_SCHEMA, True)
+    if schema is None or not schema.has_key(_PRIORITY_ORIGINS_KEY):
+        return []
+    settings = Gio.Settings(_UPDATE_SCHEMA)
+    return settings.get_strv(_PRIORITY_ORIGINS_KEY)
+
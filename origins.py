@@ -0,0 +1,52 @@
+# Copyright (C) 2015, Martin Abente Lahaye - <tch@sugarlabs.org>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+
+"""Print the origins and download size of the given name=version packages
+as JSON.
+
+Opening the apt cache is slow and memory hungry, so the model runs this
+in its own process instead of inside the shell.
+"""
+
+import sys
+import json
+
+from apt.cache import Cache
+
+
+def main(packages):
+    cache = Cache()
+    details = {}
+    for package in packages:
+        name, version = package.split('=')
+        if name not in cache:
+            continue
+        # the version picked by check(), not necessarily the candidate
+        try:
+            selected = cache[name].versions[version]
+        except KeyError:
+            selected = cache[name].candidate
+        if selected is None:
+            continue
+        origins = []
+        for origin in selected.origins:
+            origins.append([origin.origin, origin.archive, origin.label])
+        details[package] = {'size': selected.size, 'origins': origins}
+    json.dump(details, sys.stdout)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,175 @@
+# Copyright (C) 2015, Martin Abente Lahaye - <tch@sugarlabs.org>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+
+"""Grouping, budgeting and timing history for priority ordered updates."""
+
+import json
+import numbers
+import logging
+
+PRIORITY_SECURITY = 0
+PRIORITY_ORIGIN = 1
+PRIORITY_REGULAR = 2
+
+HISTORY_SAMPLES = 10
+
+DEFAULT_DOWNLOAD_RATE = 100 * 1024
+DEFAULT_INSTALL_TIME = 10.0
+
+
+def get_priority(origins, priority_origins):
+    """Return the priority of a package from its (origin, archive, label)
+    origins."""
+    for origin, archive, label in origins:
+        if archive.endswith('-security') or 'Security' in label:
+            return PRIORITY_SECURITY
+    for origin, archive, label in origins:
+        if origin in priority_origins:
+            return PRIORITY_ORIGIN
+    return PRIORITY_REGULAR
+
+
+def get_groups(packages, details, priority_origins):
+    """Split packages into install groups ordered by priority.
+
+    details maps packages to the origins and size printed by the origins
+    helper, packages without details are regular updates of unknown size.
+    Returns a list of (priority, packages, download_size) tuples, security
+    updates first, then updates from priority_origins and finally
+    everything else.
+    """
+    groups = {}
+    for package in packages:
+        priority = PRIORITY_REGULAR
+        size = 0
+        if package in details:
+            priority = get_priority(details[package]['origins'],
+                                    priority_origins)
+            size = details[package]['size']
+        group_packages, group_size = groups.get(priority, ([], 0))
+        group_packages.append(package)
+        groups[priority] = (group_packages, group_size + size)
+
+    return [(priority,) + groups[priority] for priority in sorted(groups)]
+
+
+def estimate_time(history, packages, size):
+    """Estimate in seconds how long it takes to download and install
+    packages, based on the history of previous updates."""
+    samples = history['download']
+    seconds = sum([sample[1] for sample in samples])
+    if seconds > 0:
+        rate = sum([sample[0] for sample in samples]) / float(seconds)
+    else:
+        rate = DEFAULT_DOWNLOAD_RATE
+
+    samples = history['install']
+    count = sum([sample[0] for sample in samples])
+    if count > 0:
+        per_package = sum([sample[1] for sample in samples]) / float(count)
+    else:
+        per_package = DEFAULT_INSTALL_TIME
+
+    return size / float(rate) + len(packages) * per_package
+
+
+def plan(groups, history, budget=None):
+    """Pick the leading groups whose estimated time fits in budget.
+
+    Returns the list of package lists to install and the list of
+    deferred packages. A group that does not fit defers every group after
+    it, so priority order is never broken.
+    """
+    queued = []
+    deferred = []
+    elapsed = 0
+    for priority, packages, size in groups:
+        estimate = estimate_time(history, packages, size)
+        logging.debug('update group %d: %d packages, %d bytes, %.0fs',
+                      priority, len(packages), size, estimate)
+        if deferred or (budget is not None and elapsed + estimate > budget):
+            deferred.extend(packages)
+            continue
+        elapsed += estimate
+        queued.append(packages)
+    return queued, deferred
+
+
+def drop_upgraded(groups, upgrades):
+    """Remove packages already upgraded as dependencies from the queued
+    groups.
+
+    aptdaemon fails the whole transaction when asked to upgrade an
+    up-to-date package. Returns the remaining non-empty groups and the
+    dropped packages.
+    """
+    names = set([str(package).split('=')[0] for package in upgrades])
+    remaining_groups = []
+    dropped = []
+    for packages in groups:
+        remaining = []
+        for package in packages:
+            if package.split('=')[0] in names:
+                dropped.append(package)
+            else:
+                remaining.append(package)
+        if remaining:
+            remaining_groups.append(remaining)
+    return remaining_groups, dropped
+
+
+def add_sample(history, key, sample):
+    """Append a sample to history, keeping only the latest ones."""
+    history[key] = (history[key] + [list(sample)])[-HISTORY_SAMPLES:]
+
+
+def load_history(path):
+    """Load the timing history, or an empty one when it is missing or
+    not valid."""
+    try:
+        with open(path) as history_file:
+            history = json.load(history_file)
+    except (IOError, ValueError):
+        history = None
+    if not isinstance(history, dict):
+        history = {}
+
+    valid_history = {}
+    for key in ['download', 'install']:
+        samples = history.get(key)
+        if not isinstance(samples, list) or \
+                not all([_is_sample(sample) for sample in samples]):
+            samples = []
+        valid_history[key] = samples
+    return valid_history
+
+
+def save_history(path, history):
+    try:
+        with open(path, 'w') as history_file:
+            json.dump(history, history_file)
+    except IOError:
+        logging.exception('Could not save updates history')
+
+
+def _is_sample(sample):
+    if not isinstance(sample, list) or len(sample) != 2:
+        return False
+    for value in sample:
+        if isinstance(value, bool) or \
+                not isinstance(value, numbers.Real) or value < 0:
+            return False
+    return True
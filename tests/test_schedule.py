@@ -0,0 +1,177 @@
+# Copyright (C) 2015, Martin Abente Lahaye - <tch@sugarlabs.org>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import schedule
+
+_SECURITY = ['Debian', 'stable-security', 'Debian-Security']
+_SUGAR = ['Sugar Labs', 'stable', 'Sugar Labs']
+_REGULAR = ['Debian', 'stable', 'Debian']
+
+
+def _empty_history():
+    return {'download': [], 'install': []}
+
+
+class TestGroups(unittest.TestCase):
+
+    def test_priority(self):
+        self.assertEqual(schedule.get_priority([_SECURITY], []),
+                         schedule.PRIORITY_SECURITY)
+        self.assertEqual(schedule.get_priority([_SUGAR], ['Sugar Labs']),
+                         schedule.PRIORITY_ORIGIN)
+        self.assertEqual(schedule.get_priority([_SUGAR], []),
+                         schedule.PRIORITY_REGULAR)
+        self.assertEqual(
+            schedule.get_priority([_SUGAR, _SECURITY], ['Sugar Labs']),
+            schedule.PRIORITY_SECURITY)
+
+    def test_groups_order(self):
+        details = {
+            'a=1': {'origins': [_REGULAR], 'size': 10},
+            'b=1': {'origins': [_SECURITY], 'size': 20},
+            'c=1': {'origins': [_SUGAR], 'size': 30},
+            'd=1': {'origins': [_SECURITY], 'size': 40},
+        }
+        groups = schedule.get_groups(['a=1', 'b=1', 'c=1', 'd=1'], details,
+                                     ['Sugar Labs'])
+        self.assertEqual(groups, [
+            (schedule.PRIORITY_SECURITY, ['b=1', 'd=1'], 60),
+            (schedule.PRIORITY_ORIGIN, ['c=1'], 30),
+            (schedule.PRIORITY_REGULAR, ['a=1'], 10)])
+
+    def test_groups_without_details(self):
+        groups = schedule.get_groups(['a=1', 'b=1'], {}, [])
+        self.assertEqual(groups,
+                         [(schedule.PRIORITY_REGULAR, ['a=1', 'b=1'], 0)])
+
+
+class TestEstimate(unittest.TestCase):
+
+    def test_defaults(self):
+        estimate = schedule.estimate_time(_empty_history(), ['a=1', 'b=1'],
+                                          schedule.DEFAULT_DOWNLOAD_RATE)
+        self.assertAlmostEqual(estimate,
+                               1 + 2 * schedule.DEFAULT_INSTALL_TIME)
+
+    def test_history(self):
+        history = {'download': [[1000, 1], [3000, 3]],
+                   'install': [[1, 2], [3, 6]]}
+        estimate = schedule.estimate_time(history, ['a=1', 'b=1', 'c=1'],
+                                          5000)
+        self.assertAlmostEqual(estimate, 5 + 3 * 2)
+
+
+class TestPlan(unittest.TestCase):
+
+    def setUp(self):
+        self.history = {'download': [[100, 1]], 'install': [[1, 1]]}
+        self.groups = [
+            (schedule.PRIORITY_SECURITY, ['a=1'], 100),
+            (schedule.PRIORITY_ORIGIN, ['b=1', 'c=1'], 800),
+            (schedule.PRIORITY_REGULAR, ['d=1'], 0),
+        ]
+
+    def test_no_budget(self):
+        queued, deferred = schedule.plan(self.groups, self.history)
+        self.assertEqual(queued, [['a=1'], ['b=1', 'c=1'], ['d=1']])
+        self.assertEqual(deferred, [])
+
+    def test_budget_cut_off(self):
+        # the origin group needs 10s, the regular one after it would fit
+        queued, deferred = schedule.plan(self.groups, self.history, 5)
+        self.assertEqual(queued, [['a=1']])
+        self.assertEqual(deferred, ['b=1', 'c=1', 'd=1'])
+
+    def test_budget_too_small(self):
+        queued, deferred = schedule.plan(self.groups, self.history, 1)
+        self.assertEqual(queued, [])
+        self.assertEqual(deferred, ['a=1', 'b=1', 'c=1', 'd=1'])
+
+    def test_budget_exact(self):
+        queued, deferred = schedule.plan(self.groups, self.history, 13)
+        self.assertEqual(len(queued), 3)
+        self.assertEqual(deferred, [])
+
+
+class TestDropUpgraded(unittest.TestCase):
+
+    def test_drop(self):
+        groups = [['b=1', 'c=1'], ['d=1']]
+        groups, dropped = schedule.drop_upgraded(groups, ['c=2', 'd=1', 'x=1'])
+        self.assertEqual(groups, [['b=1']])
+        self.assertEqual(dropped, ['c=1', 'd=1'])
+
+    def test_nothing_upgraded(self):
+        groups, dropped = schedule.drop_upgraded([['b=1']], [])
+        self.assertEqual(groups, [['b=1']])
+        self.assertEqual(dropped, [])
+
+
+class TestHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'history.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _load(self, content):
+        with open(self.path, 'w') as history_file:
+            history_file.write(content)
+        return schedule.load_history(self.path)
+
+    def test_missing(self):
+        self.assertEqual(schedule.load_history(self.path), _empty_history())
+
+    def test_invalid(self):
+        for content in ['', '{', '[]', 'null', '1', '"history"']:
+            self.assertEqual(self._load(content), _empty_history())
+
+    def test_invalid_samples(self):
+        for samples in [{}, [[1]], [[1, 2, 3]], [[1, 'a']], [[1, None]],
+                        [[1, -2]], [[True, 1]], [(1, 2), 'ab']]:
+            history = self._load(json.dumps({'download': samples,
+                                             'install': [[1, 2]]}))
+            self.assertEqual(history, {'download': [], 'install': [[1, 2]]})
+
+    def test_round_trip(self):
+        history = _empty_history()
+        schedule.add_sample(history, 'download', (1000, 2.5))
+        schedule.add_sample(history, 'install', (2, 30))
+        schedule.save_history(self.path, history)
+        self.assertEqual(schedule.load_history(self.path), history)
+
+    def test_add_sample_keeps_latest(self):
+        history = _empty_history()
+        for count in range(schedule.HISTORY_SAMPLES + 5):
+            schedule.add_sample(history, 'install', (count, 1))
+        self.assertEqual(len(history['install']), schedule.HISTORY_SAMPLES)
+        self.assertEqual(history['install'][-1],
+                         [schedule.HISTORY_SAMPLES + 4, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -200,7 +200,8 @@ class SystemUpdaterView(SectionView):
                           self._update_box.get_packages_to_update())
 
     def _update(self):
-        self._model.update(self._update_box.get_packages_to_update())
+        self._model.update(self._update_box.get_packages_to_update(),
+                           self._model.get_battery_budget())
         self._switch_to_progress_pane()
 
     def _updated(self, packages):
@@ -210,6 +211,25 @@ class SystemUpdaterView(SectionView):
         top_message = top_message % num_installed
         top_message = GObject.markup_escape_text(top_message)
         self._top_label.set_markup('<big>%s</big>' % top_message)
+
+        bottom_messages = []
+        num_deferred = len(self._model.get_deferred())
+        if num_deferred:
+            bottom_message = ngettext(
+                '%s update was deferred to save battery, '
+                'it will be offered again next time',
+                '%s updates were deferred to save battery, '
+                'they will be offered again next time', num_deferred)
+            bottom_messages.append(bottom_message % num_deferred)
+        num_interrupted = len(self._model.get_interrupted())
+        if num_interrupted:
+            bottom_message = ngettext(
+                '%s update was not installed, please try again later',
+                '%s updates were not installed, please try again later',
+                num_interrupted)
+            bottom_messages.append(bottom_message % num_interrupted)
+        if bottom_messages:
+            self._bottom_label.set_text('\n'.join(bottom_messages))
         self._clear_center()
 
     def _set_toolbar_cancellable(self, cancellable):